@@ -17,7 +17,513 @@ from telegram.error import TelegramError
 import json
 import os
 import sys
-from collections import defaultdict
+import queue
+import random
+import atexit
+import contextlib
+import cProfile
+import functools
+import gzip
+import hashlib
+import threading
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+
+
+QUERY_LOGGER_NAME = 'SpamhausMonitor.query'
+
+# Progresso do ciclo em andamento (retomado após reinício)
+CHECKPOINT_FILE = 'cycle_checkpoint.json'
+
+# Listener de logging compartilhado pelo processo (um por vez)
+_log_listener: Optional[QueueListener] = None
+
+
+def _stop_log_listener():
+    """Esvazia a fila de logging e encerra a thread de escrita"""
+    if _log_listener is not None:
+        _log_listener.stop()
+
+
+class _LazyQueueHandler(QueueHandler):
+    """QueueHandler que adia toda a formatação para a thread de escrita"""
+    
+    def prepare(self, record):
+        return record
+
+
+class _QueryJsonFormatter(logging.Formatter):
+    """Formata registros de consulta como uma linha JSON"""
+    
+    def format(self, record):
+        return json.dumps({
+            'ts': record.created,
+            'target': getattr(record, 'target', None),
+            'zone': getattr(record, 'zone', None),
+            'rcode': getattr(record, 'rcode', None),
+            'latency_ms': getattr(record, 'latency_ms', None),
+        })
+
+
+class CycleTracer:
+    """Registra spans cronometrados dos ciclos em formato Chrome trace
+    
+    O arquivo gerado pode ser aberto em chrome://tracing, Perfetto ou
+    speedscope. Consultas DNS individuais só viram spans quando levam pelo
+    menos ``slow_query_ms``. Cada ``save()`` grava um ciclo e descarta seus
+    eventos; o caminho aceita padrões ``strftime`` (um arquivo por ciclo).
+    """
+    
+    def __init__(self, path: str, slow_query_ms: float = 250.0):
+        self.path = path
+        self.slow_query_s = slow_query_ms / 1000.0
+        self.events: List[Dict] = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+    
+    def _add(self, name: str, started: float, duration: float, cat: str, args: Dict):
+        self.events.append({
+            'name': name,
+            'cat': cat,
+            'ph': 'X',
+            'ts': round((started - self._origin) * 1e6, 1),
+            'dur': round(duration * 1e6, 1),
+            'pid': self._pid,
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+    
+    @contextlib.contextmanager
+    def span(self, name: str, **args):
+        """Cronometra o bloco como um span da fase ``name``"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add(name, started, time.perf_counter() - started, 'phase', args)
+    
+    def add_query(self, query: str, rcode: str, started: float):
+        """Registra uma consulta DNS se ela ultrapassou o limite de lentidão"""
+        duration = time.perf_counter() - started
+        if duration >= self.slow_query_s:
+            self._add('slow_query', started, duration, 'dns', {'query': query, 'rcode': rcode})
+    
+    def save(self):
+        """Grava os eventos do ciclo no arquivo de trace e recomeça a coleta"""
+        events, self.events = self.events, []
+        with open(datetime.now().strftime(self.path), 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        self._origin = time.perf_counter()
+
+
+def _atomic_write_json(path: str, data, **dump_kwargs):
+    """Grava JSON de forma atômica (arquivo temporário + fsync + rename)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, **dump_kwargs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def run_profiled(func, profile_path: Optional[str] = None):
+    """Executa ``func`` gravando um dump do cProfile em ``profile_path`` (se informado)"""
+    if not profile_path:
+        return func()
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+
+
+class RateLimiter:
+    """Limitador de taxa simples (intervalo mínimo entre consultas)"""
+    
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloqueia até que a próxima consulta seja permitida"""
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class DnsblProvider:
+    """Metadados de um provedor de DNSBL (limites e semântica das respostas)"""
+    
+    def __init__(self, name: str, concurrency: int = 1, rate_limit: Optional[float] = 10.0,
+                 timeout: float = 10.0, cache_ttl: float = 0.0,
+                 return_codes: Optional[Dict[str, str]] = None,
+                 ignore_codes: Optional[List[str]] = None):
+        self.name = name
+        self.concurrency = max(int(concurrency), 1)
+        self.rate_limit = rate_limit
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.return_codes = return_codes or {}
+        self.ignore_codes = set(ignore_codes or [])
+        self.limiter = RateLimiter(rate_limit)
+
+
+class QueryEngine:
+    """Executa consultas de vários provedores em paralelo com cache compartilhado
+    
+    Cada provedor tem sua própria fila, limite de concorrência e de taxa, de
+    modo que um provedor lento ou restritivo não atrasa os demais.
+    """
+    
+    def __init__(self):
+        self.resolver = dns.resolver.Resolver()
+        # consulta -> (rcode, códigos, gravado_em, serial SOA da zona ao gravar)
+        self.cache: Dict[str, Tuple[str, List[str], float, Optional[int]]] = {}
+        self.capture: Optional[DnsCapture] = None
+        # Guardar todas as respostas (usado pelo atalho de serial SOA)
+        self.keep_answers = False
+        self.reused = 0
+    
+    def run(self, tasks: List[Tuple[DnsblProvider, object]]) -> List:
+        """Executa ``(provedor, callable)`` e retorna os resultados na ordem das tarefas"""
+        results = [None] * len(tasks)
+        lanes = defaultdict(deque)
+        providers = {}
+        for index, (provider, func) in enumerate(tasks):
+            lanes[provider.name].append((index, func))
+            providers[provider.name] = provider
+        
+        def drain(provider: DnsblProvider, lane: deque):
+            while True:
+                try:
+                    index, func = lane.popleft()
+                except IndexError:
+                    return
+                results[index] = func()
+        
+        workers = sum(min(providers[name].concurrency, len(lane)) for name, lane in lanes.items())
+        if workers <= 1:
+            for name, lane in lanes.items():
+                drain(providers[name], lane)
+            return results
+        
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            for name, lane in lanes.items():
+                provider = providers[name]
+                for _ in range(min(provider.concurrency, len(lane))):
+                    futures.append(executor.submit(drain, provider, lane))
+            for future in futures:
+                future.result()
+        return results
+    
+    def lookup(self, query: str, provider: DnsblProvider, timeout: float,
+               max_age: float = 0.0, serial: Optional[int] = None) -> Tuple[str, List[str]]:
+        """Resolve uma consulta usando o cache compartilhado quando ainda válido
+        
+        ``serial`` é o serial SOA atual da zona: respostas gravadas com o
+        mesmo serial valem por até ``max_age`` segundos, além do
+        ``cache_ttl`` do provedor.
+        """
+        cached = self.cache.get(query)
+        if cached:
+            ttl = provider.cache_ttl
+            if serial is not None and cached[3] == serial:
+                ttl = max(ttl, max_age)
+            if ttl and time.time() - cached[2] < ttl:
+                self.reused += 1
+                if self.capture is not None:
+                    self.capture.record(query, cached[0], cached[1], 0.0)
+                return cached[0], cached[1]
+        
+        # O limite de taxa só se aplica a consultas que vão de fato à rede
+        provider.limiter.acquire()
+        started = time.perf_counter()
+        try:
+            rcode, codes = self._resolve(query, timeout)
+        except dns.resolver.Timeout:
+            if self.capture is not None:
+                self.capture.record(query, 'TIMEOUT', [], time.perf_counter() - started)
+            raise
+        except Exception as e:
+            if self.capture is not None:
+                self.capture.record(query, 'ERROR', [str(e)], time.perf_counter() - started)
+            raise
+        
+        if self.capture is not None:
+            self.capture.record(query, rcode, codes, time.perf_counter() - started)
+        if provider.cache_ttl or self.keep_answers:
+            self.cache[query] = (rcode, codes, time.time(), serial)
+        return rcode, codes
+    
+    def zone_serial(self, zone: str, timeout: float) -> Optional[int]:
+        """Retorna o serial SOA de uma zona (None se não for possível obtê-lo)"""
+        key = f"{zone}/SOA"
+        started = time.perf_counter()
+        try:
+            serial = self._resolve_soa(zone, timeout)
+        except Exception as e:
+            if self.capture is not None:
+                self.capture.record(key, 'ERROR', [str(e)], time.perf_counter() - started)
+            return None
+        if self.capture is not None:
+            self.capture.record(key, 'NOERROR', [str(serial)], time.perf_counter() - started)
+        return serial
+    
+    def _resolve(self, query: str, timeout: float) -> Tuple[str, List[str]]:
+        """Executa a consulta DNS propriamente dita"""
+        try:
+            answers = self.resolver.resolve(query, 'A', lifetime=timeout)
+            return 'NOERROR', [str(answer) for answer in answers]
+        except dns.resolver.NXDOMAIN:
+            return 'NXDOMAIN', []
+    
+    def _resolve_soa(self, zone: str, timeout: float) -> int:
+        """Consulta o registro SOA de uma zona"""
+        answers = self.resolver.resolve(zone, 'SOA', lifetime=timeout)
+        return answers[0].serial
+
+
+class DnsCapture:
+    """Arquivo de captura de consultas DNS (JSON lines compactado com gzip)
+    
+    A primeira linha é um cabeçalho; cada linha seguinte é
+    ``[offset_ms, consulta, rcode, códigos, latência_ms]``.
+    """
+    
+    FORMAT = 'spamhaus-monitor-capture'
+    
+    def __init__(self, path: str):
+        self.path = path
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps({'format': self.FORMAT, 'version': 1,
+                                     'started': datetime.now().isoformat()}) + '\n')
+        self.count = 0
+    
+    def record(self, query: str, rcode: str, codes: List[str], latency: float):
+        """Grava uma consulta e sua resposta"""
+        line = json.dumps([round((time.perf_counter() - self._origin) * 1000, 3), query, rcode,
+                           codes, round(latency * 1000, 3)], separators=(',', ':'))
+        with self._lock:
+            self._file.write(line + '\n')
+            self.count += 1
+    
+    def close(self):
+        with self._lock:
+            self._file.close()
+    
+    @classmethod
+    def load(cls, path: str) -> Dict[str, Tuple[str, List[str], float]]:
+        """Lê uma captura como ``consulta -> (rcode, códigos, latência_s)``"""
+        responses = {}
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline() or '{}')
+            if header.get('format') != cls.FORMAT:
+                raise ValueError(f"Arquivo de captura inválido: {path}")
+            for line in f:
+                _, query, rcode, codes, latency_ms = json.loads(line)
+                responses[query] = (rcode, codes, latency_ms / 1000.0)
+        return responses
+
+
+class ReplayEngine(QueryEngine):
+    """Motor de consultas que responde a partir de uma captura gravada
+    
+    Com ``realtime`` reproduz a latência gravada de cada consulta; caso
+    contrário responde imediatamente e ignora os limites de taxa.
+    Consultas ausentes da captura são respondidas como NXDOMAIN e contadas
+    em ``missing``; o monitor interrompe o ciclo se houver alguma.
+    """
+    
+    def __init__(self, capture_path: str, realtime: bool = False):
+        super().__init__()
+        self.resolver = None
+        self.realtime = realtime
+        self.responses = DnsCapture.load(capture_path)
+        self.missing = 0
+        self.missing_example: Optional[str] = None
+    
+    def run(self, tasks: List[Tuple[DnsblProvider, object]]) -> List:
+        if not self.realtime:
+            return [func() for _, func in tasks]
+        return super().run(tasks)
+    
+    def _resolve(self, query: str, timeout: float) -> Tuple[str, List[str]]:
+        recorded = self.responses.get(query)
+        if recorded is None:
+            self.missing += 1
+            if self.missing_example is None:
+                self.missing_example = query
+            return 'NXDOMAIN', []
+        rcode, codes, latency = recorded
+        if self.realtime and latency > 0:
+            time.sleep(latency)
+        if rcode == 'TIMEOUT':
+            raise dns.resolver.Timeout()
+        if rcode == 'ERROR':
+            raise dns.exception.DNSException(codes[0] if codes else 'erro gravado')
+        return rcode, list(codes)
+    
+    def _resolve_soa(self, zone: str, timeout: float) -> int:
+        recorded = self.responses.get(f"{zone}/SOA")
+        if recorded is None or recorded[0] != 'NOERROR':
+            raise dns.exception.DNSException(f"SOA de {zone} ausente da captura")
+        return int(recorded[1][0])
+
+
+class ListingState:
+    """Estado compacto das listagens: IP (inteiro) -> máscara de zonas + códigos
+    
+    Cada zona ocupa um bit fixo (índice em ``zones``); os códigos de retorno
+    ficam num dicionário à parte, indexado por ``(ip, bit)``. A comparação
+    entre ciclos é um XOR das máscaras, sem recriar conjuntos por IP.
+    """
+    
+    __slots__ = ('zones', 'zone_bits', 'masks', 'codes')
+    
+    def __init__(self, zones: Optional[List[str]] = None):
+        self.zones: List[str] = list(zones or [])
+        self.zone_bits: Dict[str, int] = {zone: bit for bit, zone in enumerate(self.zones)}
+        self.masks: Dict[int, int] = {}
+        self.codes: Dict[Tuple[int, int], Tuple[str, ...]] = {}
+    
+    @staticmethod
+    def ip_to_int(ip: str) -> Optional[int]:
+        """Converte um IPv4 em inteiro (None para blocos CIDR ou valores inválidos)"""
+        try:
+            return int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+    
+    @staticmethod
+    def int_to_ip(value: int) -> str:
+        return str(ipaddress.IPv4Address(value))
+    
+    @classmethod
+    def from_results(cls, results: Dict, zones: Optional[List[str]] = None) -> 'ListingState':
+        """Monta o estado a partir de resultados no formato de ``check_ip_in_spamhaus``"""
+        state = cls(zones)
+        for ip, ip_results in results.items():
+            for result in ip_results:
+                state.add(ip, result['zone'], result['return_codes'])
+        return state
+    
+    def bit(self, zone: str) -> int:
+        """Retorna (registrando se necessário) o bit de uma zona"""
+        bit = self.zone_bits.get(zone)
+        if bit is None:
+            bit = len(self.zones)
+            self.zones.append(zone)
+            self.zone_bits[zone] = bit
+        return bit
+    
+    def add(self, ip: str, zone: str, return_codes: List[str]):
+        """Marca um IP como listado numa zona"""
+        value = self.ip_to_int(ip)
+        if value is None:
+            return
+        bit = self.bit(zone)
+        self.masks[value] = self.masks.get(value, 0) | (1 << bit)
+        self.codes[(value, bit)] = tuple(return_codes)
+    
+    def __contains__(self, ip: str) -> bool:
+        value = self.ip_to_int(ip)
+        return value is not None and value in self.masks
+    
+    def __len__(self) -> int:
+        return len(self.masks)
+    
+    def ips(self) -> List[str]:
+        """Lista os IPs listados"""
+        return [self.int_to_ip(value) for value in self.masks]
+    
+    def listings(self, ip: str) -> List[Tuple[str, Tuple[str, ...]]]:
+        """Retorna ``(zona, códigos)`` de cada zona em que o IP está listado"""
+        value = self.ip_to_int(ip)
+        mask = self.masks.get(value, 0) if value is not None else 0
+        return [(zone, self.codes.get((value, bit), ()))
+                for bit, zone in enumerate(self.zones) if mask >> bit & 1]
+    
+    def zones_in(self, mask: int) -> Set[str]:
+        """Converte uma máscara no conjunto de zonas correspondente"""
+        return {zone for bit, zone in enumerate(self.zones) if mask >> bit & 1}
+    
+    def discard(self, ip: str):
+        """Remove um IP do estado"""
+        value = self.ip_to_int(ip)
+        mask = self.masks.pop(value, 0)
+        for bit in range(len(self.zones)):
+            if mask >> bit & 1:
+                self.codes.pop((value, bit), None)
+    
+    def drop_zones(self, zones: Set[str]):
+        """Remove as zonas informadas de todos os IPs"""
+        bits = [self.zone_bits[zone] for zone in zones if zone in self.zone_bits]
+        if not bits:
+            return
+        clear = 0
+        for bit in bits:
+            clear |= 1 << bit
+        for value in list(self.masks):
+            mask = self.masks[value]
+            if not mask & clear:
+                continue
+            for bit in bits:
+                self.codes.pop((value, bit), None)
+            mask &= ~clear
+            if mask:
+                self.masks[value] = mask
+            else:
+                del self.masks[value]
+    
+    def changes(self, previous: 'ListingState') -> Tuple[Dict[int, int], Set[int]]:
+        """Compara com o estado anterior (mesma numeração de zonas)
+        
+        Retorna ``(novos, removidos)``: para cada IP, a máscara das zonas em
+        que passou a estar listado, e o conjunto de IPs que deixaram de
+        estar listados.
+        """
+        previous_masks = previous.masks
+        added = {}
+        for value, mask in self.masks.items():
+            new_bits = (mask ^ previous_masks.get(value, 0)) & mask
+            if new_bits:
+                added[value] = new_bits
+        removed = previous_masks.keys() - self.masks.keys()
+        return added, removed
+    
+    def to_json(self) -> Dict:
+        """Serializa em formato compacto: ``[ip, máscara, [códigos por bit]]``"""
+        listings = []
+        for value, mask in self.masks.items():
+            codes = [list(self.codes.get((value, bit), ()))
+                     for bit in range(len(self.zones)) if mask >> bit & 1]
+            listings.append([value, mask, codes])
+        return {'zones': self.zones, 'listings': listings}
+    
+    @classmethod
+    def from_json(cls, data: Dict) -> 'ListingState':
+        """Carrega o formato compacto ou o formato antigo (IP -> lista de resultados)"""
+        if 'zones' not in data or 'listings' not in data:
+            return cls.from_results(data)
+        state = cls(data['zones'])
+        for value, mask, codes in data['listings']:
+            state.masks[value] = mask
+            set_bits = [bit for bit in range(len(state.zones)) if mask >> bit & 1]
+            for bit, bit_codes in zip(set_bits, codes):
+                state.codes[(value, bit)] = tuple(bit_codes)
+        return state
 
 
 class SpamhausMonitor:
@@ -25,12 +531,28 @@ class SpamhausMonitor:
     
     def __init__(self, config_path: str = "config.yaml", debug: bool = False):
         """Inicializa o monitor com configurações do arquivo YAML"""
+        self.config_path = config_path
         self.config = self._load_config(config_path)
+        self._config_mtime = self._get_config_mtime()
+        self._monitor_job = None
+        self.tracer: Optional[CycleTracer] = None
+        self.record_path: Optional[str] = None
+        self.replaying = False
         self.debug = debug
+        # Falso quando outro monitor define o logging do processo (modo multi-cliente)
+        self.owns_logging = True
         self._setup_logging()
         self.bot = Bot(token=self.config['telegram']['bot_token'])
         self.chat_id = self.config['telegram']['chat_id']
-        self.previous_results = self._load_previous_results()
+        self._suppress_next_alerts = False
+        self.previous_state = self._load_previous_results()
+        self.listing_history = self._load_listing_history()
+        self.providers = self._build_providers()
+        self.engine = QueryEngine()
+        self.zone_serials: Dict[str, Optional[int]] = {}
+        # Seriais SOA válidos no ciclo em andamento (vazio sem soa_check)
+        self._cycle_serials: Dict[str, Optional[int]] = {}
+        self._checkpoint_plans: Dict[str, Dict] = {}
         self.original_networks = self._parse_original_networks()
         
     def _load_config(self, config_path: str) -> dict:
@@ -43,11 +565,53 @@ class SpamhausMonitor:
         except yaml.YAMLError as e:
             raise ValueError(f"Erro ao ler arquivo de configuração: {e}")
     
+    @staticmethod
+    def _validate_config(config: dict):
+        """Verifica seções e campos obrigatórios antes de aplicar uma configuração"""
+        if not isinstance(config, dict):
+            raise ValueError("Configuração vazia ou inválida")
+        for key in ('telegram', 'monitoring', 'ips_to_monitor', 'spamhaus_lists'):
+            if key not in config:
+                raise ValueError(f"Seção obrigatória ausente: {key}")
+        for key in ('bot_token', 'chat_id'):
+            if key not in (config['telegram'] or {}):
+                raise ValueError(f"Campo obrigatório ausente: telegram.{key}")
+        for key in ('interval_minutes', 'timeout_seconds'):
+            if key not in (config['monitoring'] or {}):
+                raise ValueError(f"Campo obrigatório ausente: monitoring.{key}")
+        if not isinstance(config['ips_to_monitor'], list):
+            raise ValueError("ips_to_monitor deve ser uma lista")
+        if not isinstance(config['spamhaus_lists'], list):
+            raise ValueError("spamhaus_lists deve ser uma lista")
+        for index, bl_config in enumerate(config['spamhaus_lists']):
+            for key in ('name', 'zone', 'description'):
+                if not isinstance(bl_config, dict) or key not in bl_config:
+                    raise ValueError(f"Campo obrigatório ausente: spamhaus_lists[{index}].{key}")
+        level = (config.get('logging') or {}).get('level', 'INFO')
+        if not isinstance(getattr(logging, str(level), None), int):
+            raise ValueError(f"Nível de logging inválido: {level}")
+    
+    def _get_config_mtime(self) -> Optional[float]:
+        """Retorna o mtime do arquivo de configuração (None se indisponível)"""
+        try:
+            return os.path.getmtime(self.config_path)
+        except OSError:
+            return None
+    
     def _setup_logging(self):
-        """Configura o sistema de logging"""
+        """Configura o sistema de logging
+        
+        Os registros são entregues a uma fila e escritos por uma thread de
+        fundo (QueueListener), sem bloquear as consultas DNS. Reconfigurar
+        (nova instância ou recarga) substitui os handlers em vez de duplicá-los.
+        """
+        global _log_listener
+        
         log_config = self.config.get('logging', {})
         log_level = getattr(logging, log_config.get('level', 'INFO'))
         log_file = log_config.get('file', 'spamhaus_monitor.log')
+        query_config = log_config.get('query_log', {}) or {}
+        query_file = query_config.get('file')
         
         # Configurar rotating file handler
         from logging.handlers import RotatingFileHandler
@@ -63,29 +627,235 @@ class SpamhausMonitor:
             backupCount=log_config.get('backup_count', 5)
         )
         file_handler.setFormatter(formatter)
+        file_handler.setLevel(log_level)
         
         # Console handler
         console_handler = logging.StreamHandler()
         console_handler.setFormatter(formatter)
+        console_handler.setLevel(log_level)
+        
+        handlers = [file_handler, console_handler]
+        
+        # Registros estruturados por consulta em arquivo próprio (JSON lines)
+        if query_file:
+            query_handler = RotatingFileHandler(
+                query_file,
+                maxBytes=log_config.get('max_size_mb', 10) * 1024 * 1024,
+                backupCount=log_config.get('backup_count', 5)
+            )
+            query_handler.setFormatter(_QueryJsonFormatter())
+            query_handler.addFilter(lambda record: record.name == QUERY_LOGGER_NAME)
+            file_handler.addFilter(lambda record: record.name != QUERY_LOGGER_NAME)
+            console_handler.addFilter(lambda record: record.name != QUERY_LOGGER_NAME)
+            handlers.append(query_handler)
         
         # Configure logger
         self.logger = logging.getLogger('SpamhausMonitor')
         self.logger.setLevel(log_level)
-        self.logger.addHandler(file_handler)
-        self.logger.addHandler(console_handler)
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
         
-    def _load_previous_results(self) -> dict:
+        if _log_listener is not None:
+            _log_listener.stop()
+            for handler in _log_listener.handlers:
+                handler.close()
+        else:
+            atexit.register(_stop_log_listener)
+        
+        log_queue = queue.SimpleQueue()
+        self.logger.addHandler(_LazyQueueHandler(log_queue))
+        _log_listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _log_listener.start()
+        
+        # Amostragem dos registros por consulta (0 desativa)
+        self.query_sample_rate = float(query_config.get('sample_rate', 0.0))
+        self.query_logger = logging.getLogger(QUERY_LOGGER_NAME)
+        self.query_logger.setLevel(logging.DEBUG if self.query_sample_rate > 0 else logging.CRITICAL + 1)
+    
+    def _log_query(self, target: str, zone: str, rcode: str, latency: float):
+        """Emite um registro estruturado de consulta, respeitando a amostragem"""
+        if self.query_sample_rate < 1.0 and random.random() >= self.query_sample_rate:
+            return
+        self.query_logger.debug(
+            "query %s %s %s %.1fms", target, zone, rcode, latency * 1000,
+            extra={'target': target, 'zone': zone, 'rcode': rcode,
+                   'latency_ms': round(latency * 1000, 3)}
+        )
+        
+    def enable_tracing(self, trace_path: str, slow_query_ms: float = 250.0):
+        """Ativa o rastreamento por fase dos ciclos, gravando em ``trace_path``"""
+        self.tracer = CycleTracer(trace_path, slow_query_ms)
+    
+    def enable_recording(self, record_path: str):
+        """Grava as consultas DNS de cada ciclo (aceita padrões ``strftime`` no caminho)"""
+        self.record_path = record_path
+    
+    def enable_replay(self, capture_path: str, realtime: bool = False):
+        """Responde às consultas a partir de uma captura gravada, sem DNS real
+        
+        Em modo replay as notificações do Telegram são apenas registradas no
+        log e o estado (resultados, histórico, checkpoint) é lido mas não
+        gravado, para que replays repetidos sejam determinísticos.
+        """
+        self.engine = ReplayEngine(capture_path, realtime)
+        self.engine.keep_answers = self.config['monitoring'].get('soa_check', False)
+        self.replaying = True
+        if not realtime:
+            for provider in self.providers.values():
+                provider.limiter = RateLimiter(None)
+    
+    @contextlib.contextmanager
+    def recording(self):
+        """Grava as consultas feitas dentro do bloco, se a gravação estiver ativa"""
+        if not self.record_path:
+            yield
+            return
+        path = datetime.now().strftime(self.record_path)
+        self.engine.capture = DnsCapture(path)
+        try:
+            yield
+        finally:
+            capture, self.engine.capture = self.engine.capture, None
+            capture.close()
+            self.logger.info("%d consulta(s) gravada(s) em %s", capture.count, path)
+    
+    def _check_replay_coverage(self):
+        """Interrompe o ciclo de replay se houve consultas ausentes da captura
+        
+        Sem isso as consultas ausentes viram NXDOMAIN e o ciclo produziria
+        alertas de remoção falsos (ex.: captura de uma configuração antiga).
+        """
+        if not self.replaying or not self.engine.missing:
+            return
+        missing, example = self.engine.missing, self.engine.missing_example
+        self.engine.missing, self.engine.missing_example = 0, None
+        self.logger.error("Replay: %d consulta(s) ausente(s) da captura (ex.: %s)", missing, example)
+        raise ValueError(f"{missing} consulta(s) ausente(s) da captura; "
+                         f"a configuração não corresponde à gravação")
+    
+    def _span(self, name: str, **args):
+        """Abre um span de rastreamento (no-op se o tracing estiver desativado)"""
+        if self.tracer is None:
+            return contextlib.nullcontext()
+        return self.tracer.span(name, **args)
+    
+    def _state_path(self, filename: str) -> str:
+        """Caminho de um arquivo de estado dentro de ``state_dir`` (padrão: diretório atual)"""
+        return os.path.join(self.config.get('state_dir', '.'), filename)
+    
+    def _load_previous_results(self) -> ListingState:
         """Carrega resultados anteriores para comparação"""
         try:
-            with open('previous_results.json', 'r') as f:
-                return json.load(f)
+            with open(self._state_path('previous_results.json'), 'r') as f:
+                return ListingState.from_json(json.load(f))
+        except FileNotFoundError:
+            return ListingState()
+        except (ValueError, KeyError, TypeError) as e:
+            # Sem estado confiável, o próximo ciclo serve apenas de base (sem alertas)
+            self.logger.error("previous_results.json inválido, ignorando e suprimindo alertas "
+                              "do próximo ciclo: %s", e)
+            self._suppress_next_alerts = True
+            return ListingState()
+    
+    def _save_results(self, state: ListingState):
+        """Salva o estado atual para próxima comparação"""
+        if self.replaying:
+            return
+        with self._span('save_results', items=len(state)):
+            _atomic_write_json(self._state_path('previous_results.json'), state.to_json(), separators=(',', ':'))
+    
+    def _results_from_state(self, ip: str, state: Optional[ListingState] = None) -> List[Dict]:
+        """Reconstrói os resultados de um IP a partir do estado compacto"""
+        state = state or self.previous_state
+        lists_by_zone = {bl['zone']: bl for bl in self.config['spamhaus_lists']}
+        results = []
+        for zone, return_codes in state.listings(ip):
+            bl_config = lists_by_zone.get(zone, {})
+            results.append({
+                'ip': ip,
+                'blacklist': bl_config.get('name', zone),
+                'zone': zone,
+                'description': bl_config.get('description', ''),
+                'listed': True,
+                'return_codes': list(return_codes),
+                'timestamp': None
+            })
+        return results
+    
+    def _load_listing_history(self) -> dict:
+        """Carrega o histórico de listagens usado na priorização"""
+        try:
+            with open(self._state_path('listing_history.json'), 'r') as f:
+                history = json.load(f)
         except FileNotFoundError:
-            return {}
+            history = {}
+        history.setdefault('listed', {})
+        history.setdefault('checked', {})
+        return history
+    
+    def _save_listing_history(self):
+        """Salva o histórico de listagens"""
+        if self.replaying:
+            return
+        with self._span('save_history'):
+            _atomic_write_json(self._state_path('listing_history.json'), self.listing_history)
     
-    def _save_results(self, results: dict):
-        """Salva resultados atuais para próxima comparação"""
-        with open('previous_results.json', 'w') as f:
-            json.dump(results, f, indent=2)
+    def _checkpoint_key(self, targets: List[str], lists: Optional[List[Dict]] = None) -> str:
+        """Identifica o plano do ciclo (alvos e zonas) para validar a retomada"""
+        digest = hashlib.sha1()
+        for zone in sorted(bl['zone'] for bl in (lists or self.config['spamhaus_lists'])):
+            digest.update(zone.encode() + b'\0')
+        for target in targets:
+            digest.update(target.encode() + b'\n')
+        return digest.hexdigest()
+    
+    def _load_checkpoint(self, key: str) -> Tuple[int, ListingState, float]:
+        """Carrega o progresso de um ciclo interrompido com o mesmo plano
+        
+        O arquivo guarda uma entrada por plano (``key``), de modo que os
+        grupos de consultas de um ciclo (ex.: modo multi-cliente) são
+        retomados cada um de onde parou. Retorna ``(alvos_concluídos,
+        resultados_parciais, início_do_ciclo)``; ``(0, vazio, agora)`` se não
+        houver checkpoint válido. O início original é mantido nas retomadas
+        para que o checkpoint expire mesmo com reinícios sucessivos.
+        """
+        self._checkpoint_plans = {}
+        try:
+            with open(self._state_path(CHECKPOINT_FILE), 'r') as f:
+                plans = json.load(f)['plans']
+            max_age = self.config['monitoring'].get('checkpoint_max_age_minutes', 720) * 60
+            for plan_key, checkpoint in plans.items():
+                if time.time() - checkpoint['started'] > max_age:
+                    self.logger.info("Checkpoint expirado descartado")
+                else:
+                    self._checkpoint_plans[plan_key] = checkpoint
+            checkpoint = self._checkpoint_plans.get(key)
+            if checkpoint is not None:
+                return checkpoint['done'], ListingState.from_json(checkpoint['state']), checkpoint['started']
+        except FileNotFoundError:
+            pass
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            self.logger.warning("Checkpoint inválido descartado: %s", e)
+            self._checkpoint_plans = {}
+        return 0, ListingState(), time.time()
+    
+    def _save_checkpoint(self, key: str, started: float, done: int, results: Dict):
+        """Grava atomicamente o progresso do ciclo em andamento"""
+        state = ListingState.from_results({k: v for k, v in results.items() if v})
+        self._checkpoint_plans[key] = {'started': started, 'done': done, 'state': state.to_json()}
+        with self._span('checkpoint', done=done):
+            _atomic_write_json(self._state_path(CHECKPOINT_FILE), {'plans': self._checkpoint_plans})
+    
+    def _clear_checkpoint(self):
+        """Remove o checkpoint após o ciclo ser concluído e salvo"""
+        if self.replaying:
+            return
+        self._checkpoint_plans = {}
+        try:
+            os.remove(self._state_path(CHECKPOINT_FILE))
+        except FileNotFoundError:
+            pass
     
     def reverse_ip(self, ip: str) -> str:
         """Inverte um endereço IP para consulta DNS reversa"""
@@ -100,69 +870,115 @@ class SpamhausMonitor:
         except ValueError:
             return None
     
-    def check_ip_in_spamhaus(self, ip: str) -> List[Dict]:
-        """Verifica se um IP está listado em alguma blacklist do Spamhaus"""
-        results = []
-        reversed_ip = self.reverse_ip(ip)
+    def check_ip_in_spamhaus(self, ip: str, lists: Optional[List[Dict]] = None) -> List[Dict]:
+        """Verifica se um IP está listado em alguma blacklist do Spamhaus
         
-        if not reversed_ip:
-            self.logger.warning(f"Não foi possível processar o IP: {ip}")
-            return results
+        Se ``lists`` for informado, consulta apenas essas blacklists em vez de
+        todas as configuradas em ``spamhaus_lists``.
+        """
+        return self._check_targets([ip], lists).get(ip, [])
+    
+    def _build_providers(self, config: Optional[dict] = None) -> Dict[str, DnsblProvider]:
+        """Monta os provedores a partir de ``providers`` e das blacklists configuradas"""
+        config = config or self.config
+        providers_config = config.get('providers', {}) or {}
+        default_timeout = config['monitoring']['timeout_seconds']
+        providers = {}
+        for bl_config in config['spamhaus_lists']:
+            name = self._provider_name(bl_config)
+            if name in providers:
+                continue
+            settings = dict(providers_config.get(name, {}) or {})
+            settings.setdefault('timeout', default_timeout)
+            try:
+                providers[name] = DnsblProvider(name, **settings)
+            except TypeError as e:
+                raise ValueError(f"Configuração inválida para o provedor {name}: {e}")
+        return providers
+    
+    def _provider_name(self, bl_config: Dict) -> str:
+        """Retorna o provedor de uma blacklist (padrão: domínio registrado da zona)"""
+        return bl_config.get('provider') or '.'.join(bl_config['zone'].split('.')[-2:])
+    
+    def _code_semantics(self, bl_config: Dict, provider: DnsblProvider) -> Tuple[Set[str], Dict[str, str]]:
+        """Códigos ignorados e significados de uma blacklist (a entrada sobrescreve o provedor)"""
+        if 'ignore_codes' in bl_config:
+            ignore_codes = set(bl_config['ignore_codes'] or ())
+        else:
+            ignore_codes = provider.ignore_codes
+        if 'return_codes' in bl_config:
+            code_meanings = bl_config['return_codes'] or {}
+        else:
+            code_meanings = provider.return_codes
+        return ignore_codes, code_meanings
+    
+    def _query_list(self, ip: str, reversed_ip: str, bl_config: Dict, debug: bool) -> Optional[Dict]:
+        """Consulta um IP em uma blacklist e retorna o resultado se estiver listado"""
+        bl_name = bl_config['name']
+        bl_zone = bl_config['zone']
+        provider = self.providers[self._provider_name(bl_config)]
+        timeout = bl_config.get('timeout', provider.timeout)
+        serial = self._cycle_serials.get(bl_zone)
+        ignore_codes, code_meanings = self._code_semantics(bl_config, provider)
         
-        if self.debug:
-            self.logger.debug(f"Verificando IP {ip} (reverso: {reversed_ip})")
+        query = f"{reversed_ip}.{bl_zone}"
         
-        for bl_config in self.config['spamhaus_lists']:
-            bl_name = bl_config['name']
-            bl_zone = bl_config['zone']
-            bl_description = bl_config['description']
+        if debug:
+            self.logger.debug("Consultando: %s", query)
+        
+        started = time.perf_counter()
+        rcode = 'ERROR'
+        try:
+            rcode, return_codes = self.engine.lookup(query, provider, timeout, self._soa_max_age(), serial)
             
-            query = f"{reversed_ip}.{bl_zone}"
+            if rcode == 'NXDOMAIN':
+                # IP não está listado nesta blacklist
+                if debug:
+                    self.logger.debug("NXDOMAIN para %s - não listado", query)
+                return None
             
-            if self.debug:
-                self.logger.debug(f"Consultando: {query}")
+            # Códigos de erro do provedor (ex.: resolvedor bloqueado) não são listagens
+            if ignore_codes and all(code in ignore_codes for code in return_codes):
+                rcode = 'IGNORED'
+                self.logger.warning("Resposta de erro do provedor %s para %s: %s",
+                                    provider.name, query, return_codes)
+                return None
             
-            try:
-                resolver = dns.resolver.Resolver()
-                resolver.timeout = self.config['monitoring']['timeout_seconds']
-                
-                answers = resolver.resolve(query, 'A')
-                
-                # Se chegou aqui, o IP está listado
-                return_codes = [str(answer) for answer in answers]
-                
-                result = {
-                    'ip': ip,
-                    'blacklist': bl_name,
-                    'zone': bl_zone,
-                    'description': bl_description,
-                    'listed': True,
-                    'return_codes': return_codes,
-                    'timestamp': datetime.now().isoformat()
-                }
-                
-                results.append(result)
-                self.logger.info(f"IP {ip} encontrado em {bl_name} ({bl_zone})")
-                if self.debug:
-                    self.logger.debug(f"Retorno da consulta {query}: {return_codes}")
-                
-            except dns.resolver.NXDOMAIN:
-                # IP não está listado nesta blacklist
-                if self.debug:
-                    self.logger.debug(f"NXDOMAIN para {query} - não listado")
-                continue
-            except dns.resolver.Timeout:
-                self.logger.warning(f"Timeout ao verificar {ip} em {bl_name}")
-                if self.debug:
-                    self.logger.debug(f"Timeout na consulta {query}")
-                continue
-            except Exception as e:
-                self.logger.error(f"Erro ao verificar {ip} em {bl_name}: {e}")
-                if self.debug:
-                    self.logger.debug(f"Erro na consulta {query}: {e}")
-                continue
-        
-        return results
+            # Se chegou aqui, o IP está listado
+            result = {
+                'ip': ip,
+                'blacklist': bl_name,
+                'zone': bl_zone,
+                'description': bl_config['description'],
+                'listed': True,
+                'return_codes': return_codes,
+                'timestamp': datetime.now().isoformat()
+            }
+            result['provider'] = provider.name
+            if code_meanings:
+                result['meanings'] = [code_meanings.get(code, code) for code in return_codes]
+            
+            self.logger.info("IP %s encontrado em %s (%s)", ip, bl_name, bl_zone)
+            if debug:
+                self.logger.debug("Retorno da consulta %s: %s", query, return_codes)
+            return result
+            
+        except dns.resolver.Timeout:
+            rcode = 'TIMEOUT'
+            self.logger.warning("Timeout ao verificar %s em %s", ip, bl_name)
+            if debug:
+                self.logger.debug("Timeout na consulta %s", query)
+            return None
+        except Exception as e:
+            self.logger.error("Erro ao verificar %s em %s: %s", ip, bl_name, e)
+            if debug:
+                self.logger.debug("Erro na consulta %s: %s", query, e)
+            return None
+        finally:
+            if self.query_sample_rate > 0:
+                self._log_query(ip, bl_zone, rcode, time.perf_counter() - started)
+            if self.tracer is not None:
+                self.tracer.add_query(query, rcode, started)
     
     def expand_network_hierarchical(self, network_str: str) -> List[str]:
         """Expande uma rede CIDR hierarquicamente em sub-blocos menores"""
@@ -265,11 +1081,276 @@ class SpamhausMonitor:
         """Monitora todos os IPs configurados"""
         self.logger.info("Iniciando verificação de IPs no Spamhaus")
         
-        all_results = {}
+        with self.recording(), self._span('monitor_ips'):
+            with self._span('expand'):
+                plan = self.plan_targets(self.config['ips_to_monitor'])
+            ips_to_check = plan['targets']
+            
+            self.logger.info(
+                "Plano: %d alvo(s) únicos x %d blacklist(s) = %d consulta(s) "
+                "(%d duplicado(s) e %d item(ns) não consultável(is) descartados)",
+                len(ips_to_check), len(self.config['spamhaus_lists']), plan['queries'],
+                plan['duplicates'], plan['unqueryable']
+            )
+            
+            with self._span('prioritize'):
+                ips_to_check, deferred = self.prioritize_targets(ips_to_check)
+            
+            if self.config['monitoring'].get('soa_check', False):
+                with self._span('soa'):
+                    self._cycle_serials = self._refresh_zone_serials()
+            
+            self.engine.reused = 0
+            try:
+                with self._span('dns', targets=len(ips_to_check)):
+                    all_results = self._check_targets_checkpointed(ips_to_check)
+            finally:
+                self._cycle_serials = {}
+            self._check_replay_coverage()
+            
+            if self.engine.reused:
+                self.logger.info("%d resposta(s) reaproveitada(s) do cache sem nova consulta",
+                                 self.engine.reused)
+            
+            # Itens adiados mantêm o último resultado conhecido (sem falsa remoção)
+            for item in deferred:
+                if item in self.previous_state:
+                    all_results[item] = self._results_from_state(item)
+            
+            if deferred or self._prioritization_config().get('query_budget'):
+                self._update_listing_history(ips_to_check, all_results)
+            
+            results_to_save = self._finish_cycle(all_results)
+            self._clear_checkpoint()
+        
+        if self.tracer is not None:
+            self.tracer.save()
+        
+        self.logger.info(f"Verificação concluída. {len(results_to_save)} IPs/blocos encontrados em blacklists")
+        return results_to_save
+    
+    def plan_targets(self, entries: List[str]) -> Dict:
+        """Monta o plano de consultas: normaliza, colapsa e deduplica os alvos
+        
+        Entradas repetidas ou contidas em outra rede expandida por completo
+        (/24 ou menor) são descartadas antes da expansão; depois os IPs de
+        todas as origens são deduplicados e itens que não podem ser
+        consultados (sub-blocos CIDR, IPv6, valores inválidos) são removidos.
+        """
+        normalized = []
+        for entry in entries:
+            try:
+                if '/' in entry:
+                    network = ipaddress.ip_network(entry, strict=False)
+                    normalized.append((entry, network))
+                else:
+                    normalized.append((entry, ipaddress.ip_address(entry)))
+            except ValueError:
+                self.logger.warning("Entrada inválida ignorada no plano: %s", entry)
+        
+        # Apenas IPv4 pode ser consultado nas DNSBLs (ver reverse_ip)
+        unqueryable = sum(1 for _, obj in normalized if obj.version != 4)
+        normalized = [(entry, obj) for entry, obj in normalized if obj.version == 4]
+        
+        # Redes com prefixo >= /24 são expandidas em todos os hosts (hosts(),
+        # sem endereço de rede e broadcast); só o que cai nessa faixa é coberto
+        exhaustive = [(net, self._host_range(net)) for _, net in normalized
+                      if isinstance(net, ipaddress.IPv4Network) and net.prefixlen > 23]
+        
+        kept_entries = []
+        seen_entries = set()
+        collapsed = []
+        for entry, obj in normalized:
+            if obj in seen_entries:
+                collapsed.append(entry)
+                continue
+            seen_entries.add(obj)
+            first, last = self._host_range(obj)
+            covered = any(obj != net and hosts[0] <= first and last <= hosts[1]
+                          for net, hosts in exhaustive)
+            if covered:
+                collapsed.append(entry)
+                continue
+            kept_entries.append(entry)
+        
+        if collapsed:
+            self.logger.info("Entradas colapsadas no plano: %s", ', '.join(collapsed))
+        
+        targets = []
+        seen = set()
+        duplicates = 0
+        for item in self._expand_targets(kept_entries):
+            if self.reverse_ip(item) is None:
+                unqueryable += 1
+                continue
+            if item in seen:
+                duplicates += 1
+                continue
+            seen.add(item)
+            targets.append(item)
+        
+        return {
+            'targets': targets,
+            'collapsed_entries': collapsed,
+            'duplicates': duplicates,
+            'unqueryable': unqueryable,
+            'queries': len(targets) * len(self.config['spamhaus_lists']),
+        }
+    
+    @staticmethod
+    def _host_range(obj) -> Tuple[int, int]:
+        """Primeiro e último endereço gerados na expansão de um IP ou rede"""
+        if isinstance(obj, ipaddress.IPv4Address):
+            return int(obj), int(obj)
+        if obj.prefixlen >= 31:
+            return int(obj.network_address), int(obj.broadcast_address)
+        return int(obj.network_address) + 1, int(obj.broadcast_address) - 1
+    
+    def _soa_max_age(self) -> float:
+        """Idade máxima (s) de uma resposta reaproveitada por serial SOA inalterado"""
+        return self.config['monitoring'].get('soa_max_age_minutes', 360) * 60
+    
+    def _refresh_zone_serials(self, lists: Optional[List[Dict]] = None) -> Dict[str, Optional[int]]:
+        """Consulta o serial SOA atual de cada zona
+        
+        Cada resposta em cache guarda o serial da zona no momento em que foi
+        obtida e só é reaproveitada se ele for igual ao atual, inclusive para
+        alvos adiados ou verificados fora do ciclo (recarga da configuração).
+        """
+        lists = lists or self.config['spamhaus_lists']
+        self.engine.keep_answers = True
+        serials = {}
+        unchanged = set()
+        for bl_config in lists:
+            zone = bl_config['zone']
+            provider = self.providers[self._provider_name(bl_config)]
+            serial = self.engine.zone_serial(zone, bl_config.get('timeout', provider.timeout))
+            if serial is not None and serial == self.zone_serials.get(zone):
+                unchanged.add(zone)
+            elif serial is None:
+                self.logger.warning("Serial SOA indisponível para %s, consultando todos os alvos", zone)
+            self.zone_serials[zone] = serial
+            serials[zone] = serial
+        
+        if unchanged:
+            self.logger.info("Serial SOA inalterado em %d de %d zona(s): %s", len(unchanged),
+                             len(lists), ', '.join(sorted(unchanged)))
+        return serials
+    
+    def _prioritization_config(self) -> dict:
+        """Retorna a seção de priorização da configuração"""
+        return self.config.get('prioritization', {}) or {}
+    
+    def _risk_score(self, ip: str, now: float, hot_prefixes: Dict[str, Set[str]]) -> float:
+        """Calcula o risco de um alvo a partir do estado atual e do histórico
+        
+        Listado agora vale 1,0; uma listagem passada vale ao menos 0,5
+        dentro da meia-vida (mais com listagens repetidas) e decai depois;
+        outro IP listado no mesmo /24 soma ``neighbor_weight`` (padrão 0,5).
+        """
+        prio_config = self._prioritization_config()
+        half_life = prio_config.get('history_half_life_days', 30) * 86400
+        
+        score = 0.0
+        if ip in self.previous_state:
+            score += 1.0
+        
+        # Listagens passadas pesam menos conforme envelhecem
+        entry = self.listing_history['listed'].get(ip)
+        if entry:
+            decay = 0.5 ** (max(now - entry['last'], 0) / half_life) if half_life > 0 else 0.0
+            score += decay * (1 + 0.05 * (min(entry['count'], 5) - 1))
+        
+        # Vizinhos no mesmo /24 de um IP listado (o próprio histórico não conta)
+        if any(other != ip for other in hot_prefixes.get(ip.rsplit('.', 1)[0], ())):
+            score += prio_config.get('neighbor_weight', 0.5)
+        
+        return score
+    
+    def prioritize_targets(self, targets: List[str]) -> Tuple[List[str], List[str]]:
+        """Seleciona os alvos do ciclo dentro do orçamento de consultas
+        
+        Alvos de alto risco (listados antes ou vizinhos de listados) entram
+        em todo ciclo; o orçamento restante é preenchido em rodízio pelos
+        alvos de baixo risco verificados há mais tempo. Retorna
+        ``(selecionados, adiados)``. Sem ``query_budget`` todos são verificados.
+        """
+        prio_config = self._prioritization_config()
+        budget = prio_config.get('query_budget', 0)
+        zones = max(len(self.config['spamhaus_lists']), 1)
+        max_targets = budget // zones
+        if budget and not max_targets:
+            self.logger.warning(
+                "prioritization.query_budget (%d) menor que o número de blacklists (%d): "
+                "verificando 1 alvo por ciclo", budget, zones
+            )
+            max_targets = 1
+        
+        if not budget or len(targets) <= max_targets:
+            return targets, []
+        
+        now = time.time()
+        half_life = prio_config.get('history_half_life_days', 30) * 86400
+        hot_prefixes = defaultdict(set)
+        for ip in self.previous_state.ips():
+            hot_prefixes[ip.rsplit('.', 1)[0]].add(ip)
+        for ip, entry in self.listing_history['listed'].items():
+            if half_life > 0 and now - entry['last'] < half_life:
+                hot_prefixes[ip.rsplit('.', 1)[0]].add(ip)
+        
+        threshold = prio_config.get('high_risk_threshold', 0.5)
+        high_risk = []
+        low_risk = []
+        for ip in targets:
+            score = self._risk_score(ip, now, hot_prefixes)
+            if score >= threshold:
+                high_risk.append((score, ip))
+            else:
+                low_risk.append((score, ip))
+        
+        # Empates de risco são desfeitos pelo alvo verificado há mais tempo
+        checked = self.listing_history['checked']
+        high_risk.sort(key=lambda pair: (-pair[0], checked.get(pair[1], 0)))
+        if len(high_risk) > max_targets:
+            self.logger.warning(
+                "Orçamento de %d consultas insuficiente para %d alvos de alto risco; "
+                "verificando os %d de maior risco", budget, len(high_risk), max_targets
+            )
+        
+        selected = [ip for _, ip in high_risk[:max_targets]]
+        remaining = max_targets - len(selected)
+        if remaining > 0:
+            # Rodízio: maior tempo sem verificação primeiro, ponderado pelo risco
+            low_risk.sort(key=lambda pair: -(now - checked.get(pair[1], 0)) * (1 + pair[0]))
+            selected.extend(ip for _, ip in low_risk[:remaining])
+        
+        chosen = set(selected)
+        deferred = [ip for ip in targets if ip not in chosen]
+        self.logger.info(
+            "Priorização: %d alvo(s) de alto risco, %d de baixo risco amostrado(s), %d adiado(s)",
+            min(len(high_risk), max_targets), len(selected) - min(len(high_risk), max_targets), len(deferred)
+        )
+        return selected, deferred
+    
+    def _update_listing_history(self, checked_targets: List[str], results: Dict):
+        """Atualiza o histórico de listagens com os alvos verificados no ciclo"""
+        now = time.time()
+        checked = self.listing_history['checked']
+        listed = self.listing_history['listed']
+        for ip in checked_targets:
+            checked[ip] = now
+            if results.get(ip):
+                entry = listed.setdefault(ip, {'count': 0, 'last': now})
+                entry['count'] += 1
+                entry['last'] = now
+        self._save_listing_history()
+    
+    def _expand_targets(self, entries: List[str]) -> List[str]:
+        """Expande IPs e redes configurados em itens para verificação"""
         ips_to_check = []
         
         # Expandir IPs e redes com pesquisa hierárquica
-        for ip_or_network in self.config['ips_to_monitor']:
+        for ip_or_network in entries:
             if '/' in ip_or_network:
                 # É uma rede - usar expansão hierárquica
                 if self.debug:
@@ -282,68 +1363,132 @@ class SpamhausMonitor:
                 # É um IP individual
                 ips_to_check.append(ip_or_network)
         
-        if self.debug:
-            self.logger.debug(f"Total de {len(ips_to_check)} itens para verificação (incluindo sub-blocos e IPs)")
+        return ips_to_check
+    
+    def _check_targets(self, ips_to_check: List[str], lists: Optional[List[Dict]] = None) -> Dict:
+        """Consulta cada item nas blacklists e retorna os resultados por item
         
-        # Verificar cada IP/bloco
+        As consultas de todos os itens são entregues juntas ao motor de
+        consultas, que as intercala entre os provedores respeitando os
+        limites de concorrência e de taxa de cada um.
+        """
+        all_results = {}
+        debug = self.debug and self.logger.isEnabledFor(logging.DEBUG)
+        if lists is None:
+            lists = self.config['spamhaus_lists']
+        
+        tasks = []
+        task_ips = []
         for ip in ips_to_check:
-            if self.debug:
-                self.logger.debug(f"Verificando: {ip}")
-            
-            results = self.check_ip_in_spamhaus(ip)
+            reversed_ip = self.reverse_ip(ip)
+            if not reversed_ip:
+                self.logger.warning("Não foi possível processar o IP: %s", ip)
+                continue
+            if debug:
+                self.logger.debug("Verificando IP %s (reverso: %s)", ip, reversed_ip)
+            for bl_config in lists:
+                provider = self.providers[self._provider_name(bl_config)]
+                tasks.append((provider, functools.partial(self._query_list, ip, reversed_ip, bl_config, debug)))
+                task_ips.append(ip)
+        
+        found = defaultdict(list)
+        for ip, result in zip(task_ips, self.engine.run(tasks)):
+            if result:
+                found[ip].append(result)
+        
+        # Verificar cada IP/bloco
+        for ip in dict.fromkeys(task_ips):
+            results = found.get(ip)
             if results:
                 all_results[ip] = results
-                if self.debug:
-                    self.logger.debug(f"ENCONTRADO em blacklist: {ip} -> {[r['blacklist'] for r in results]}")
+                if debug:
+                    self.logger.debug("ENCONTRADO em blacklist: %s -> %s", ip, [r['blacklist'] for r in results])
             elif self.debug:
                 # No modo debug, também registrar IPs limpos
                 all_results[ip] = []
-                self.logger.debug(f"Limpo: {ip}")
-            
-            # Pequena pausa entre verificações para evitar rate limiting
-            time.sleep(0.3)
+                if debug:
+                    self.logger.debug("Limpo: %s", ip)
+        
+        return all_results
+    
+    def _check_targets_checkpointed(self, ips_to_check: List[str], lists: Optional[List[Dict]] = None) -> Dict:
+        """Consulta os alvos em lotes, gravando um checkpoint após cada lote
+        
+        Se houver checkpoint de um ciclo interrompido com o mesmo plano, os
+        alvos já concluídos não são consultados de novo e seus resultados
+        parciais são reaproveitados.
+        """
+        batch_size = self.config['monitoring'].get('checkpoint_every', 256)
+        if not batch_size or self.replaying:
+            return self._check_targets(ips_to_check, lists)
         
+        key = self._checkpoint_key(ips_to_check, lists)
+        done, partial_state, started = self._load_checkpoint(key)
+        all_results = {}
+        if done:
+            self.logger.info("Retomando ciclo interrompido: %d de %d alvo(s) já verificados",
+                             done, len(ips_to_check))
+            for ip in partial_state.ips():
+                all_results[ip] = self._results_from_state(ip, partial_state)
+        
+        for start in range(done, len(ips_to_check), batch_size):
+            batch = ips_to_check[start:start + batch_size]
+            all_results.update(self._check_targets(batch, lists))
+            self._save_checkpoint(key, started, start + len(batch), all_results)
+        
+        return all_results
+    
+    def _finish_cycle(self, all_results: Dict) -> Dict:
+        """Unifica, salva e notifica os resultados de um ciclo de verificação"""
         # Unificar resultados por CIDR original
-        unified_results = self._unify_results_by_cidr({k: v for k, v in all_results.items() if v})
+        with self._span('unify'):
+            unified_results = self._unify_results_by_cidr({k: v for k, v in all_results.items() if v})
         
         # Modo debug: mostrar resultados detalhados
         if self.debug:
-            self._print_debug_results({k: v for k, v in all_results.items() if v}, unified_results)
+            with self._span('debug_output'):
+                self._print_debug_results({k: v for k, v in all_results.items() if v}, unified_results)
         
         # Salvar resultados (apenas IPs com problemas)
         results_to_save = {k: v for k, v in all_results.items() if v}
-        self._save_results(results_to_save)
+        current_state = ListingState.from_results(results_to_save, self.previous_state.zones)
+        self._save_results(current_state)
         
         # Verificar mudanças e enviar notificações apenas se necessário
-        if self._should_send_telegram_notification(results_to_save, self.previous_results):
-            self._check_changes_and_notify_unified(results_to_save, unified_results)
+        with self._span('notify'):
+            if self._suppress_next_alerts:
+                self.logger.info("Ciclo de base após perda de estado: notificações suprimidas")
+                self._suppress_next_alerts = False
+                self.previous_state = current_state
+            elif self._should_send_telegram_notification(current_state, self.previous_state):
+                self._check_changes_and_notify_unified(results_to_save, unified_results, current_state)
+            else:
+                # Manter o estado em memória alinhado com o arquivo salvo
+                self.previous_state = current_state
         
-        self.logger.info(f"Verificação concluída. {len(results_to_save)} IPs/blocos encontrados em blacklists")
         return results_to_save
     
     def _check_changes_and_notify(self, current_results: Dict):
         """Verifica mudanças em relação à verificação anterior e envia notificações"""
-        # Novos IPs listados
-        for ip, results in current_results.items():
-            if ip not in self.previous_results:
+        current_state = ListingState.from_results(current_results, self.previous_state.zones)
+        added, removed = current_state.changes(self.previous_state)
+        
+        # Novos IPs listados ou novas blacklists
+        for value, new_bits in added.items():
+            ip = ListingState.int_to_ip(value)
+            new_zones = current_state.zones_in(new_bits)
+            results = [r for r in current_results[ip] if r['zone'] in new_zones]
+            if value not in self.previous_state.masks:
                 # IP recém-listado
                 self._send_alert(ip, results, "NOVO")
             else:
-                # Verificar se há novas blacklists
-                previous_bls = {r['blacklist'] for r in self.previous_results[ip]}
-                current_bls = {r['blacklist'] for r in results}
-                new_bls = current_bls - previous_bls
-                
-                if new_bls:
-                    new_results = [r for r in results if r['blacklist'] in new_bls]
-                    self._send_alert(ip, new_results, "NOVA_BLACKLIST")
+                self._send_alert(ip, results, "NOVA_BLACKLIST")
         
         # IPs removidos das blacklists
-        for ip in self.previous_results:
-            if ip not in current_results:
-                self._send_removal_alert(ip)
+        for value in removed:
+            self._send_removal_alert(ListingState.int_to_ip(value))
         
-        self.previous_results = current_results.copy()
+        self.previous_state = current_state
     
     def _send_alert(self, ip: str, results: List[Dict], alert_type: str):
         """Envia alerta via Telegram"""
@@ -371,6 +1516,9 @@ class SpamhausMonitor:
     
     def _send_telegram_message(self, message: str):
         """Envia mensagem via Telegram"""
+        if self.replaying:
+            self.logger.info("[replay] Notificação não enviada:\n%s", message)
+            return
         try:
             asyncio.create_task(self.bot.send_message(
                 chat_id=self.chat_id,
@@ -394,6 +1542,10 @@ class SpamhausMonitor:
         # Restaurar debug
         self.debug = original_debug
         
+        self._send_status_message(results)
+    
+    def _send_status_message(self, results: Dict):
+        """Monta e envia a mensagem de relatório a partir dos resultados de um ciclo"""
         if not results:
             message = "✅ **RELATÓRIO SPAMHAUS**\n\n"
             message += "Todos os IPs monitorados estão limpos! 🎉\n\n"
@@ -419,12 +1571,113 @@ class SpamhausMonitor:
         
         self._send_telegram_message(message)
     
+    def reload_config_if_changed(self) -> bool:
+        """Recarrega a configuração se o arquivo foi modificado desde a última leitura"""
+        mtime = self._get_config_mtime()
+        if mtime is None or mtime == self._config_mtime:
+            return False
+        self._config_mtime = mtime
+        return self.reload_config()
+    
+    def reload_config(self) -> bool:
+        """Recarrega a configuração em execução e verifica apenas o que mudou
+        
+        Redes/IPs adicionados são expandidos e verificados imediatamente,
+        itens removidos saem do estado sem gerar alertas de remoção e os
+        resultados de itens inalterados são mantidos.
+        """
+        try:
+            new_config = self._load_config(self.config_path)
+            self._validate_config(new_config)
+            new_providers = self._build_providers(new_config)
+        except (FileNotFoundError, ValueError, KeyError, TypeError) as e:
+            self.logger.error("Configuração não recarregada, mantendo a anterior: %s", e)
+            return False
+        
+        old_config = self.config
+        old_entries = set(old_config['ips_to_monitor'])
+        new_entries = set(new_config['ips_to_monitor'])
+        added_entries = [e for e in new_config['ips_to_monitor'] if e not in old_entries]
+        removed_entries = old_entries - new_entries
+        kept_entries = [e for e in new_config['ips_to_monitor'] if e in old_entries]
+        
+        old_zones = {bl['zone'] for bl in old_config['spamhaus_lists']}
+        new_zones = {bl['zone'] for bl in new_config['spamhaus_lists']}
+        added_lists = [bl for bl in new_config['spamhaus_lists'] if bl['zone'] not in old_zones]
+        removed_zones = old_zones - new_zones
+        
+        self.config = new_config
+        self.original_networks = self._parse_original_networks()
+        self.providers = new_providers
+        
+        if new_config.get('logging') != old_config.get('logging') and self.owns_logging:
+            self._setup_logging()
+        
+        if new_config['telegram'] != old_config['telegram']:
+            self.bot = Bot(token=new_config['telegram']['bot_token'])
+            self.chat_id = new_config['telegram']['chat_id']
+        
+        # Só reagendar se este monitor controla o próprio agendamento
+        # (no modo multi-cliente o agendamento é compartilhado)
+        interval_changed = new_config['monitoring'].get('interval_minutes') != old_config['monitoring'].get('interval_minutes')
+        if interval_changed and self._monitor_job is not None:
+            self._schedule_monitoring()
+        
+        self.logger.info(
+            "Configuração recarregada: %d item(ns) adicionado(s), %d removido(s), "
+            "%d blacklist(s) nova(s), %d blacklist(s) removida(s)",
+            len(added_entries), len(removed_entries), len(added_lists), len(removed_zones)
+        )
+        
+        # Descartar do estado IPs que não serão mais consultados (um IP dentro
+        # de um bloco grande pode não estar na amostra expandida) e blacklists
+        # que deixaram de ser consultadas, sem alertas
+        if removed_entries:
+            targets = set(self.plan_targets(new_config['ips_to_monitor'])['targets'])
+            for item in self.previous_state.ips():
+                if item not in targets:
+                    self.previous_state.discard(item)
+        self.previous_state.drop_zones(removed_zones)
+        self._save_results(self.previous_state)
+        
+        if not added_entries and not added_lists:
+            return True
+        
+        # Verificar imediatamente apenas os alvos e blacklists novos
+        kept_targets = self.plan_targets(kept_entries)['targets']
+        found = {}
+        if added_entries:
+            known = set(kept_targets)
+            added_targets = [t for t in self.plan_targets(added_entries)['targets'] if t not in known]
+            found.update(self._check_targets(added_targets))
+        if added_lists and kept_targets:
+            for item, item_results in self._check_targets(kept_targets, added_lists).items():
+                found.setdefault(item, []).extend(item_results)
+        
+        current_results = {item: self._results_from_state(item) for item in self.previous_state.ips()}
+        for item, item_results in found.items():
+            if not item_results:
+                continue
+            zones = {r['zone'] for r in item_results}
+            merged = [r for r in current_results.get(item, []) if r['zone'] not in zones]
+            current_results[item] = merged + item_results
+        
+        self._finish_cycle(current_results)
+        return True
+    
+    def _schedule_monitoring(self):
+        """(Re)agenda as verificações periódicas conforme o intervalo configurado"""
+        if self._monitor_job is not None:
+            schedule.cancel_job(self._monitor_job)
+        interval = self.config['monitoring']['interval_minutes']
+        self._monitor_job = schedule.every(interval).minutes.do(self.monitor_ips)
+    
     def run_continuous_monitoring(self):
         """Executa monitoramento contínuo"""
         interval = self.config['monitoring']['interval_minutes']
         
         # Agendar verificações
-        schedule.every(interval).minutes.do(self.monitor_ips)
+        self._schedule_monitoring()
         
         # Relatório diário às 9:00
         schedule.every().day.at("09:00").do(self.send_status_report)
@@ -437,6 +1690,8 @@ class SpamhausMonitor:
         # Loop principal
         try:
             while True:
+                if self.config['monitoring'].get('reload_config', True):
+                    self.reload_config_if_changed()
                 schedule.run_pending()
                 time.sleep(60)  # Verificar schedule a cada minuto
         except KeyboardInterrupt:
@@ -565,44 +1820,33 @@ class SpamhausMonitor:
         print(f"🎯 Itens únicos verificados: {len(results)}")
         print(f"🌐 Redes CIDR originais afetadas: {len([k for k in unified_results.keys() if '/' in k])}")
     
-    def _should_send_telegram_notification(self, current_results: Dict, previous_results: Dict) -> bool:
+    def _should_send_telegram_notification(self, current_state: ListingState,
+                                           previous_state: ListingState) -> bool:
         """Determina se deve enviar notificação do Telegram baseado em mudanças"""
-        # Enviar se houver novos IPs listados ou novas blacklists
-        for ip, results in current_results.items():
-            if ip not in previous_results:
-                return True  # Novo IP listado
-            
-            # Verificar novas blacklists para IP existente
-            previous_bls = {r['blacklist'] for r in previous_results[ip]}
-            current_bls = {r['blacklist'] for r in results}
-            if current_bls - previous_bls:
-                return True  # Nova blacklist para IP existente
-        
-        # Verificar IPs removidos (também notificar)
-        if set(previous_results.keys()) - set(current_results.keys()):
-            return True
-        
-        return False
+        # Novos IPs, novas blacklists ou IPs removidos (também notificar)
+        added, removed = current_state.changes(previous_state)
+        return bool(added or removed)
     
-    def _check_changes_and_notify_unified(self, current_results: Dict, unified_results: Dict):
+    def _check_changes_and_notify_unified(self, current_results: Dict, unified_results: Dict,
+                                          current_state: Optional[ListingState] = None):
         """Verifica mudanças e envia notificações unificadas por CIDR"""
+        if current_state is None:
+            current_state = ListingState.from_results(current_results, self.previous_state.zones)
+        added, removed = current_state.changes(self.previous_state)
+        
         # Verificar novos IPs ou novas blacklists
         new_listings = {}
         new_blacklists = {}
         
-        for ip, results in current_results.items():
-            if ip not in self.previous_results:
+        for value, new_bits in added.items():
+            ip = ListingState.int_to_ip(value)
+            if value not in self.previous_state.masks:
                 # IP recém-listado
-                new_listings[ip] = results
+                new_listings[ip] = current_results[ip]
             else:
-                # Verificar se há novas blacklists
-                previous_bls = {r['blacklist'] for r in self.previous_results[ip]}
-                current_bls = {r['blacklist'] for r in results}
-                new_bls = current_bls - previous_bls
-                
-                if new_bls:
-                    new_results = [r for r in results if r['blacklist'] in new_bls]
-                    new_blacklists[ip] = new_results
+                # Apenas as blacklists novas para o IP
+                new_zones = current_state.zones_in(new_bits)
+                new_blacklists[ip] = [r for r in current_results[ip] if r['zone'] in new_zones]
         
         # Enviar notificações unificadas para novos listings
         if new_listings:
@@ -613,13 +1857,12 @@ class SpamhausMonitor:
             self._send_unified_alert(new_blacklists, unified_results, "NOVA_BLACKLIST")
         
         # IPs removidos das blacklists
-        removed_ips = set(self.previous_results.keys()) - set(current_results.keys())
+        removed_ips = {ListingState.int_to_ip(value) for value in removed}
         if removed_ips:
             self._send_unified_removal_alert(removed_ips)
         
-        # Atualizar cache em memória e arquivo
-        self.previous_results = current_results.copy()
-        self._save_results(current_results)
+        # Atualizar cache em memória (o arquivo já foi salvo em _finish_cycle)
+        self.previous_state = current_state
     
     def _send_unified_alert(self, affected_items: Dict, unified_results: Dict, alert_type: str):
         """Envia alerta unificado via Telegram"""
@@ -739,6 +1982,264 @@ class SpamhausMonitor:
         
         self._send_telegram_message(message)
     
+class MultiTenantMonitor:
+    """Executa vários clientes (configs) com um único plano de consultas
+    
+    Os alvos de todos os clientes são deduplicados e consultados uma única
+    vez por um motor compartilhado; os resultados são então separados por
+    cliente, cada um com seu estado, detecção de mudanças e chat do Telegram.
+    A primeira configuração define intervalo, logging e limites dos provedores.
+    """
+    
+    def __init__(self, config_paths: List[str], debug: bool = False):
+        if not config_paths:
+            raise ValueError("Informe ao menos uma configuração de cliente")
+        
+        self.tenants: List[Tuple[str, SpamhausMonitor]] = []
+        state_dirs = {}
+        for config_path in config_paths:
+            tenant = SpamhausMonitor(config_path=config_path, debug=debug)
+            name = tenant.config.get('name') or os.path.splitext(os.path.basename(config_path))[0]
+            state_dir = os.path.abspath(tenant.config.get('state_dir', '.'))
+            if state_dir in state_dirs:
+                raise ValueError(f"Clientes {state_dirs[state_dir]} e {name} usam o mesmo state_dir: {state_dir}")
+            state_dirs[state_dir] = name
+            self.tenants.append((name, tenant))
+        
+        for _, tenant in self.tenants[1:]:
+            tenant.owns_logging = False
+        self.primary = self.tenants[0][1]
+        # Cada instância reconfigura o logging; manter o da primeira configuração
+        self.primary._setup_logging()
+        self.logger = self.primary.logger
+        self._monitor_job = None
+        self._interval = None
+    
+    def _share_engine(self):
+        """Faz todos os clientes usarem o motor, provedores e tracer da primeira configuração"""
+        providers = self.primary.providers
+        for _, tenant in self.tenants[1:]:
+            for name, provider in tenant.providers.items():
+                providers.setdefault(name, provider)
+        for _, tenant in self.tenants[1:]:
+            tenant.engine = self.primary.engine
+            tenant.tracer = self.primary.tracer
+            tenant.replaying = self.primary.replaying
+    
+    def monitor_all(self) -> Dict[str, Dict]:
+        """Executa um ciclo compartilhado e retorna os resultados por cliente"""
+        primary = self.primary
+        self.logger.info("Iniciando verificação compartilhada de %d cliente(s)", len(self.tenants))
+        self._share_engine()
+        
+        with primary.recording(), primary._span('monitor_all', tenants=len(self.tenants)):
+            # Máscara de clientes por IP: memória proporcional aos IPs únicos
+            tenant_masks: Dict[str, int] = {}
+            deferred_by_tenant = []
+            planned_total = 0
+            with primary._span('expand'):
+                for index, (name, tenant) in enumerate(self.tenants):
+                    plan = tenant.plan_targets(tenant.config['ips_to_monitor'])
+                    selected, deferred = tenant.prioritize_targets(plan['targets'])
+                    deferred_by_tenant.append(deferred)
+                    planned_total += len(selected)
+                    bit = 1 << index
+                    for ip in selected:
+                        tenant_masks[ip] = tenant_masks.get(ip, 0) | bit
+            
+            # Zonas consultadas por IP = união das zonas dos clientes que o monitoram.
+            # A consulta compartilhada não filtra códigos: cada cliente aplica os
+            # seus (ignore_codes/return_codes) ao separar os resultados
+            lists_by_zone = {}
+            tenant_zones = []
+            for _, tenant in self.tenants:
+                for bl_config in tenant.config['spamhaus_lists']:
+                    provider = tenant.providers[tenant._provider_name(bl_config)]
+                    timeout = bl_config.get('timeout', provider.timeout)
+                    shared = lists_by_zone.get(bl_config['zone'])
+                    if shared is None:
+                        lists_by_zone[bl_config['zone']] = dict(
+                            bl_config, provider=provider.name, timeout=timeout,
+                            ignore_codes=[], return_codes={}
+                        )
+                    else:
+                        shared['timeout'] = max(shared['timeout'], timeout)
+                tenant_zones.append({bl['zone']: bl for bl in tenant.config['spamhaus_lists']})
+            
+            zones_for_mask = {}
+            groups = defaultdict(list)
+            for ip, mask in tenant_masks.items():
+                zones = zones_for_mask.get(mask)
+                if zones is None:
+                    zones = tuple(zone for zone in lists_by_zone
+                                  if any(mask >> index & 1 and zone in tenant_zones[index]
+                                         for index in range(len(self.tenants))))
+                    zones_for_mask[mask] = zones
+                groups[zones].append(ip)
+            
+            queries = sum(len(ips) * len(zones) for zones, ips in groups.items())
+            self.logger.info(
+                "Plano compartilhado: %d alvo(s) únicos (%d somando os clientes) = %d consulta(s)",
+                len(tenant_masks), planned_total, queries
+            )
+            
+            if primary.config['monitoring'].get('soa_check', False):
+                with primary._span('soa'):
+                    primary._cycle_serials = primary._refresh_zone_serials(list(lists_by_zone.values()))
+            
+            found = {}
+            primary.engine.reused = 0
+            try:
+                with primary._span('dns', targets=len(tenant_masks)):
+                    for zones, ips in groups.items():
+                        lists = [lists_by_zone[zone] for zone in zones]
+                        found.update(primary._check_targets_checkpointed(ips, lists))
+            finally:
+                primary._cycle_serials = {}
+            primary._check_replay_coverage()
+            
+            if primary.engine.reused:
+                self.logger.info("%d resposta(s) reaproveitada(s) do cache sem nova consulta",
+                                 primary.engine.reused)
+            
+            # Separar os resultados por cliente
+            tenant_results = [{} for _ in self.tenants]
+            for ip, mask in tenant_masks.items():
+                ip_results = found.get(ip)
+                if ip_results is None:
+                    continue
+                for index in range(len(self.tenants)):
+                    if not mask >> index & 1:
+                        continue
+                    tenant = self.tenants[index][1]
+                    own_lists = tenant_zones[index]
+                    filtered = [r for r in (self._for_tenant(tenant, r, own_lists[r['zone']])
+                                            for r in ip_results if r['zone'] in own_lists) if r]
+                    if filtered or self.tenants[index][1].debug:
+                        tenant_results[index][ip] = filtered
+            
+            results = {}
+            for index, (name, tenant) in enumerate(self.tenants):
+                with primary._span('tenant', tenant=name):
+                    own_results = tenant_results[index]
+                    deferred = deferred_by_tenant[index]
+                    for item in deferred:
+                        if item in tenant.previous_state:
+                            own_results[item] = tenant._results_from_state(item)
+                    
+                    if deferred or tenant._prioritization_config().get('query_budget'):
+                        bit = 1 << index
+                        checked = [ip for ip, mask in tenant_masks.items() if mask & bit]
+                        tenant._update_listing_history(checked, own_results)
+                    
+                    results[name] = tenant._finish_cycle(own_results)
+                    self.logger.info("Cliente %s: %d IP(s) em blacklists", name, len(results[name]))
+            
+            primary._clear_checkpoint()
+        
+        if primary.tracer is not None:
+            primary.tracer.save()
+        
+        return results
+    
+    def _for_tenant(self, tenant: SpamhausMonitor, result: Dict, bl_config: Dict) -> Optional[Dict]:
+        """Aplica a configuração do cliente (nome, descrição e códigos) a um resultado
+        
+        Retorna None se todos os códigos estiverem entre os ``ignore_codes``
+        do cliente para essa blacklist.
+        """
+        provider = tenant.providers[tenant._provider_name(bl_config)]
+        ignore_codes, code_meanings = tenant._code_semantics(bl_config, provider)
+        return_codes = result['return_codes']
+        if ignore_codes and all(code in ignore_codes for code in return_codes):
+            self.logger.warning("Resposta de erro do provedor %s para %s em %s: %s",
+                                provider.name, result['ip'], bl_config['zone'], return_codes)
+            return None
+        
+        tenant_result = dict(result, blacklist=bl_config['name'], description=bl_config['description'],
+                             provider=provider.name)
+        tenant_result.pop('meanings', None)
+        if code_meanings:
+            tenant_result['meanings'] = [code_meanings.get(code, code) for code in return_codes]
+        return tenant_result
+    
+    def send_status_reports(self):
+        """Executa um ciclo compartilhado e envia o relatório de cada cliente"""
+        original_debug = [(tenant, tenant.debug) for _, tenant in self.tenants]
+        for tenant, _ in original_debug:
+            tenant.debug = False
+        
+        results = self.monitor_all()
+        
+        for tenant, debug in original_debug:
+            tenant.debug = debug
+        
+        for name, tenant in self.tenants:
+            tenant._send_status_message(results[name])
+    
+    def _schedule_monitoring(self):
+        """(Re)agenda o ciclo compartilhado conforme o intervalo da primeira configuração"""
+        if self._monitor_job is not None:
+            schedule.cancel_job(self._monitor_job)
+        self._interval = self.primary.config['monitoring']['interval_minutes']
+        self._monitor_job = schedule.every(self._interval).minutes.do(self.monitor_all)
+    
+    def run_continuous_monitoring(self):
+        """Executa monitoramento contínuo de todos os clientes"""
+        self._schedule_monitoring()
+        
+        # Relatório diário às 9:00
+        schedule.every().day.at("09:00").do(self.send_status_reports)
+        
+        self.logger.info("Monitoramento multi-cliente iniciado (%d clientes). Verificações a cada %d minutos",
+                         len(self.tenants), self._interval)
+        
+        # Executar primeira verificação
+        self.monitor_all()
+        
+        # Loop principal
+        try:
+            while True:
+                for _, tenant in self.tenants:
+                    if tenant.config['monitoring'].get('reload_config', True):
+                        tenant.reload_config_if_changed()
+                if self.primary.config['monitoring']['interval_minutes'] != self._interval:
+                    self._schedule_monitoring()
+                schedule.run_pending()
+                time.sleep(60)  # Verificar schedule a cada minuto
+        except KeyboardInterrupt:
+            self.logger.info("Monitoramento interrompido pelo usuário")
+        except Exception as e:
+            self.logger.error("Erro no monitoramento: %s", e)
+
+
+def add_diagnostic_arguments(parser):
+    """Adiciona as opções de rastreamento, profiling e gravação/replay à CLI"""
+    parser.add_argument('--trace', metavar='ARQUIVO',
+                       help='Gravar spans de cada fase do ciclo em formato Chrome trace/speedscope '
+                            '(aceita padrões strftime, ex.: ciclo-%%Y%%m%%d-%%H%%M.json)')
+    parser.add_argument('--slow-query-ms', type=float, default=250.0,
+                       help='Registrar no trace consultas DNS mais lentas que este limite (padrão: 250)')
+    parser.add_argument('--profile', metavar='ARQUIVO',
+                       help='Gravar dump do cProfile (pstats) da execução')
+    parser.add_argument('--record', metavar='ARQUIVO',
+                       help='Gravar consultas e respostas DNS do ciclo (aceita padrões strftime, ex.: captura-%%Y%%m%%d-%%H%%M.jsonl.gz)')
+    parser.add_argument('--replay', metavar='ARQUIVO',
+                       help='Responder às consultas a partir de uma captura gravada, sem DNS real')
+    parser.add_argument('--replay-realtime', action='store_true',
+                       help='No replay, reproduzir a latência gravada em vez de responder imediatamente')
+
+
+def apply_diagnostic_arguments(monitor: 'SpamhausMonitor', args):
+    """Aplica ao monitor as opções adicionadas por ``add_diagnostic_arguments``"""
+    if args.replay:
+        monitor.enable_replay(args.replay, args.replay_realtime)
+    if args.record:
+        monitor.enable_recording(args.record)
+    if args.trace:
+        monitor.enable_tracing(args.trace, args.slow_query_ms)
+
+
 def main():
     """Função principal"""
     import argparse
@@ -750,31 +2251,23 @@ def main():
                        help='Arquivo de configuração (padrão: config.yaml)')
     parser.add_argument('--run-once', action='store_true',
                        help='Executar uma única verificação e sair')
+    parser.add_argument('--tenants', nargs='+', metavar='CONFIG',
+                       help='Modo multi-cliente: uma configuração por cliente, com plano de consultas compartilhado')
+    add_diagnostic_arguments(parser)
     
     args = parser.parse_args()
     
     try:
+        if args.tenants:
+            multi = MultiTenantMonitor(args.tenants, debug=args.debug)
+            apply_diagnostic_arguments(multi.primary, args)
+            run_profiled(lambda: _run_tenants(multi, args), args.profile)
+            return
+        
         monitor = SpamhausMonitor(config_path=args.config, debug=args.debug)
+        apply_diagnostic_arguments(monitor, args)
         
-        if args.run_once:
-            # Executar uma única verificação
-            results = monitor.monitor_ips()
-            if not args.debug and results:
-                print(f"\n🚨 {len(results)} IP(s) encontrado(s) em blacklists")
-                # Mostrar resumo unificado mesmo fora do debug
-                unified = monitor._unify_results_by_cidr(results)
-                for key, data in unified.items():
-                    if '/' in key:
-                        print(f"🌐 Rede {key}: {len(data['ips'])} IP(s)")
-                    else:
-                        print(f"🔴 IP {key}")
-                    for bl in data['blacklists']:
-                        print(f"  • {bl}: {len(data['blacklists'][bl])} IP(s)")
-            elif not args.debug:
-                print("\n✅ Todos os IPs estão limpos!")
-        else:
-            # Monitoramento contínuo
-            monitor.run_continuous_monitoring()
+        run_profiled(lambda: _run(monitor, args), args.profile)
             
     except KeyboardInterrupt:
         print("\n\n⏹️ Monitoramento interrompido pelo usuário")
@@ -787,5 +2280,42 @@ def main():
         sys.exit(1)
 
 
+def _run(monitor: SpamhausMonitor, args):
+    """Executa o modo selecionado na linha de comando"""
+    if args.run_once:
+        # Executar uma única verificação
+        results = monitor.monitor_ips()
+        if not args.debug and results:
+            print(f"\n🚨 {len(results)} IP(s) encontrado(s) em blacklists")
+            # Mostrar resumo unificado mesmo fora do debug
+            unified = monitor._unify_results_by_cidr(results)
+            for key, data in unified.items():
+                if '/' in key:
+                    print(f"🌐 Rede {key}: {len(data['ips'])} IP(s)")
+                else:
+                    print(f"🔴 IP {key}")
+                for bl in data['blacklists']:
+                    print(f"  • {bl}: {len(data['blacklists'][bl])} IP(s)")
+        elif not args.debug:
+            print("\n✅ Todos os IPs estão limpos!")
+    else:
+        # Monitoramento contínuo
+        monitor.run_continuous_monitoring()
+
+
+def _run_tenants(multi: MultiTenantMonitor, args):
+    """Executa o modo multi-cliente selecionado na linha de comando"""
+    if args.run_once:
+        results = multi.monitor_all()
+        if not args.debug:
+            for name, tenant_results in results.items():
+                if tenant_results:
+                    print(f"\n🚨 Cliente {name}: {len(tenant_results)} IP(s) encontrado(s) em blacklists")
+                else:
+                    print(f"\n✅ Cliente {name}: todos os IPs estão limpos!")
+    else:
+        multi.run_continuous_monitoring()
+
+
 if __name__ == "__main__":
     main()
@@ -5,12 +5,21 @@ Script de utilitários para o Spamhaus Monitor
 
 import argparse
 import sys
-from spamhaus_monitor import SpamhausMonitor
+from spamhaus_monitor import (SpamhausMonitor, run_profiled, add_diagnostic_arguments,
+                              apply_diagnostic_arguments)
 
 
-def check_single_ip(ip: str, debug: bool = False):
-    """Verifica um único IP"""
+def _create_monitor(debug: bool = False, args=None) -> SpamhausMonitor:
+    """Cria o monitor, aplicando as opções de diagnóstico da linha de comando"""
     monitor = SpamhausMonitor(debug=debug)
+    if args is not None:
+        apply_diagnostic_arguments(monitor, args)
+    return monitor
+
+
+def check_single_ip(ip: str, debug: bool = False, args=None):
+    """Verifica um único IP"""
+    monitor = _create_monitor(debug, args)
     
     if debug:
         print(f"\n🔍 VERIFICANDO IP: {ip} (modo debug ativado)")
@@ -19,7 +28,11 @@ def check_single_ip(ip: str, debug: bool = False):
             print(f"   • {bl['name']} - {bl['zone']}")
         print("=" * 50)
     
-    results = monitor.check_ip_in_spamhaus(ip)
+    with monitor.recording(), monitor._span('check_ip', ip=ip):
+        results = monitor.check_ip_in_spamhaus(ip)
+        monitor._check_replay_coverage()
+    if monitor.tracer is not None:
+        monitor.tracer.save()
     
     if results:
         print(f"\n🚨 IP {ip} encontrado nas seguintes blacklists:")
@@ -43,9 +56,9 @@ def check_single_ip(ip: str, debug: bool = False):
                 print(f"   • {query} -> NXDOMAIN (não listado)")
 
 
-def run_single_check(debug: bool = False):
+def run_single_check(debug: bool = False, args=None):
     """Executa uma única verificação de todos os IPs configurados"""
-    monitor = SpamhausMonitor(debug=debug)
+    monitor = _create_monitor(debug, args)
     results = monitor.monitor_ips()
     
     if not debug:
@@ -75,6 +88,21 @@ def run_single_check(debug: bool = False):
     # Modo debug já imprime tudo no monitor_ips()
 
 
+def show_plan():
+    """Mostra o plano de consultas sem enviar nenhuma consulta DNS"""
+    monitor = SpamhausMonitor()
+    plan = monitor.plan_targets(monitor.config['ips_to_monitor'])
+    
+    print(f"\n📋 PLANO DE CONSULTAS")
+    print(f"   🎯 Alvos únicos: {len(plan['targets'])}")
+    print(f"   📝 Blacklists: {len(monitor.config['spamhaus_lists'])}")
+    print(f"   🔢 Consultas planejadas: {plan['queries']}")
+    print(f"   ♻️ Duplicados descartados: {plan['duplicates']}")
+    print(f"   🚫 Itens não consultáveis descartados: {plan['unqueryable']}")
+    if plan['collapsed_entries']:
+        print(f"   📦 Entradas colapsadas: {', '.join(plan['collapsed_entries'])}")
+
+
 def send_test_message():
     """Envia uma mensagem de teste via Telegram"""
     monitor = SpamhausMonitor()
@@ -85,11 +113,12 @@ def send_test_message():
 
 def main():
     parser = argparse.ArgumentParser(description="Utilitários do Spamhaus Monitor")
-    parser.add_argument('command', choices=['check-ip', 'run-once', 'test-telegram'], 
+    parser.add_argument('command', choices=['check-ip', 'run-once', 'plan', 'test-telegram'], 
                        help='Comando a executar')
     parser.add_argument('--ip', help='IP para verificar (usado com check-ip)')
     parser.add_argument('--debug', '-d', action='store_true',
                        help='Modo debug com saída detalhada')
+    add_diagnostic_arguments(parser)
     
     args = parser.parse_args()
     
@@ -98,10 +127,13 @@ def main():
             if not args.ip:
                 print("Erro: --ip é obrigatório para o comando check-ip")
                 sys.exit(1)
-            check_single_ip(args.ip, debug=args.debug)
+            run_profiled(lambda: check_single_ip(args.ip, debug=args.debug, args=args), args.profile)
         
         elif args.command == 'run-once':
-            run_single_check(debug=args.debug)
+            run_profiled(lambda: run_single_check(debug=args.debug, args=args), args.profile)
+        
+        elif args.command == 'plan':
+            show_plan()
         
         elif args.command == 'test-telegram':
             send_test_message()